@@ -1,42 +1,56 @@
-import os
+import ast
+import importlib.util
 import re
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-def find_imports_from_file(filepath):
+# Line-based fallback for files Python 3 cannot parse (e.g. the MGLTools / Python 2 scripts)
+IMPORT_RE = re.compile(r'^\s*(?:import|from)\s+([\w\.]+)')
+
+def _imports_by_regex(source):
     imports = set()
+    for line in source.splitlines():
+        m = IMPORT_RE.match(line)
+        if m:
+            pkg = m.group(1).split('.')[0]  # get top-level package
+            if pkg:
+                imports.add(pkg)
+    return imports
+
+def find_imports_from_file(filepath):
     with open(filepath, 'r', encoding='utf-8') as f:
-        for line in f:
-            # Match import statements: import x or from x import y
-            m = re.match(r'^\s*(?:import|from)\s+([\w\.]+)', line)
-            if m:
-                pkg = m.group(1).split('.')[0]  # get top-level package
-                # Ignore relative imports and built-in modules
-                if pkg and not pkg.startswith('.'):
-                    imports.add(pkg)
+        source = f.read()
+    try:
+        tree = ast.parse(source, filename=str(filepath))
+    except SyntaxError:
+        return _imports_by_regex(source)
+
+    imports = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.update(alias.name.split('.')[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+            # level > 0 is a relative import of a local module
+            imports.add(node.module.split('.')[0])
     return imports
 
 def find_all_imports(root_dir):
-    all_imports = set()
-    for dirpath, _, filenames in os.walk(root_dir):
-        for filename in filenames:
-            if filename.endswith('.py'):
-                full_path = os.path.join(dirpath, filename)
-                all_imports.update(find_imports_from_file(full_path))
-    return all_imports
+    # Reading sources is I/O-bound, so parse files on a thread pool as the walk yields them
+    with ThreadPoolExecutor() as ex:
+        return set().union(*ex.map(find_imports_from_file, Path(root_dir).rglob('*.py')))
 
 def is_package_installed(pkg):
-    # Run python -c "import pkg"
-    result = subprocess.run(
-        [sys.executable, '-c', f'import {pkg}'],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE
-    )
-    return result.returncode == 0
+    # Look the module up in-process instead of booting an interpreter per package
+    try:
+        return importlib.util.find_spec(pkg) is not None
+    except (ImportError, ValueError):
+        return False
 
-def install_package(pkg):
-    print(f"Installing package: {pkg}")
-    result = subprocess.run([sys.executable, '-m', 'pip', 'install', pkg])
+def install_packages(pkgs):
+    print(f"Installing packages: {' '.join(pkgs)}")
+    result = subprocess.run([sys.executable, '-m', 'pip', 'install', *pkgs])
     return result.returncode == 0
 
 if __name__ == "__main__":
@@ -48,7 +62,8 @@ if __name__ == "__main__":
     stdlib_modules = {
         'os', 'sys', 're', 'subprocess', 'math', 'time', 'json', 'logging',
         'pathlib', 'threading', 'collections', 'functools', 'itertools',
-        'shutil', 'tempfile', 'unittest', 'enum', 'argparse', 'typing'
+        'shutil', 'tempfile', 'unittest', 'enum', 'argparse', 'typing',
+        'ast', 'concurrent', 'importlib', 'multiprocessing'
     }
 
     to_install = [pkg for pkg in imports if pkg not in stdlib_modules]
@@ -58,14 +73,17 @@ if __name__ == "__main__":
     else:
         print(f"Packages to check/install: {to_install}")
 
+    missing = []
     for pkg in to_install:
         if not is_package_installed(pkg):
             print(f"Package '{pkg}' not found.")
-            success = install_package(pkg)
-            if not success:
-                print(f"Failed to install package '{pkg}'. Aborting.")
-                sys.exit(1)
+            missing.append(pkg)
         else:
             print(f"Package '{pkg}' is already installed.")
 
+    # One pip run resolves all missing packages together
+    if missing and not install_packages(missing):
+        print(f"Failed to install packages {missing}. Aborting.")
+        sys.exit(1)
+
     print("All required packages are installed.")
@@ -1,24 +1,110 @@
 # convert_sdf_to_pdb.py  (run with Python 3: vizdock env)
 import os
+import multiprocessing as mp
+from collections import defaultdict
 from pathlib import Path
-from rdkit import Chem
 
 SDF_DIR  = Path("data/ligands")
 OUT_DIR  = Path("data/ligands_pdb")
 OUT_DIR.mkdir(parents=True, exist_ok=True)
 
-def convert_one(sdf_path: Path) -> bool:
+# Legacy atom-block charge codes (superseded by "M  CHG" lines when present)
+_ATOM_BLOCK_CHARGE = {1: 3, 2: 2, 3: 1, 5: -1, 6: -2, 7: -3}
+
+def read_first_molblock(sdf_path: Path):
+    """
+    Stream the first V2000 record of an SDF: (title, atoms, bonds, charges).
+    atoms = [(x, y, z, element)], bonds = [(a1, a2, order)] with 1-based indices,
+    charges = {atom index: formal charge}. Returns None for anything but V2000.
+    """
+    with open(sdf_path) as f:
+        header = [f.readline() for _ in range(4)]
+        counts = header[3]
+        if "V2000" not in counts:
+            return None
+        n_atoms, n_bonds = int(counts[0:3]), int(counts[3:6])
+
+        atoms, charges = [], {}
+        for i in range(1, n_atoms + 1):
+            line = f.readline()
+            atoms.append((float(line[0:10]), float(line[10:20]), float(line[20:30]), line[31:34].strip()))
+            code = int(line[36:39] or 0)
+            if code in _ATOM_BLOCK_CHARGE:
+                charges[i] = _ATOM_BLOCK_CHARGE[code]
+        bonds = []
+        for _ in range(n_bonds):
+            line = f.readline()
+            bonds.append((int(line[0:3]), int(line[3:6]), int(line[6:9])))
+
+        chg_lines = []
+        for line in f:
+            if line.startswith("M  END"):
+                break
+            if line.startswith("M  CHG"):
+                chg_lines.append(line)
+        if chg_lines:
+            charges = {}
+            for line in chg_lines:
+                fields = line.split()[3:]
+                for k in range(0, len(fields) - 1, 2):
+                    charges[int(fields[k])] = int(fields[k + 1])
+    return header[0].strip(), atoms, bonds, charges
+
+def write_pdb(pdb_path: Path, title, atoms, bonds, charges) -> None:
+    """Write HETATM/CONECT records laid out like RDKit's MolToPDBFile (UNL residue, per-element names)."""
+    out = ["COMPND    %s" % title] if title else []
+    per_elem = defaultdict(int)
+    for i, (x, y, z, elem) in enumerate(atoms, 1):
+        elem = elem.upper()
+        per_elem[elem] += 1
+        name = "%s%d" % (elem, per_elem[elem])
+        if len(elem) == 1 and len(name) < 4:
+            name = " " + name
+        chg = charges.get(i, 0)
+        chg_str = "%d%s" % (abs(chg), "+" if chg > 0 else "-") if chg else ""
+        out.append("HETATM%5d %-4s UNL     1    %8.3f%8.3f%8.3f  1.00  0.00          %2s%-2s"
+                   % (i, name, x, y, z, elem, chg_str))
+
+    # Bond order is conveyed by repeating the partner; each bond listed once, from its lower index
+    partners = defaultdict(list)
+    for a1, a2, order in bonds:
+        lo, hi = min(a1, a2), max(a1, a2)
+        partners[lo].extend([hi] * (order if order in (2, 3) else 1))
+    for i in sorted(partners):
+        nbrs = sorted(partners[i])
+        for k in range(0, len(nbrs), 4):
+            out.append("CONECT%5d" % i + "".join("%5d" % j for j in nbrs[k:k + 4]))
+    out.append("END")
+
+    with open(pdb_path, "w") as f:
+        f.write("\n".join(out) + "\n")
+
+def _convert_with_rdkit(sdf_path: Path, pdb_path: Path) -> bool:
+    from rdkit import Chem  # only needed for records the streaming reader cannot handle
+
     # Read first molecule from SDF
     suppl = Chem.SDMolSupplier(str(sdf_path), removeHs=False)
     mol = suppl[0] if suppl and len(suppl) > 0 else None
     if mol is None:
         print(f"[WARN] RDKit could not read {sdf_path.name}")
         return False
-
     # Ensure we keep 3D coords if present; write PDB
+    Chem.MolToPDBFile(mol, str(pdb_path))
+    return True
+
+def convert_one(sdf_path: Path) -> bool:
     pdb_path = OUT_DIR / (sdf_path.stem + ".pdb")
-    ok = Chem.MolToPDBFile(mol, str(pdb_path))
-    # RDKit returns None; check the file
+    try:
+        record = read_first_molblock(sdf_path)
+    except (ValueError, IndexError) as e:
+        print(f"[INFO] {sdf_path.name}: streaming reader failed ({e}); using RDKit")
+        record = None
+    if record is not None:
+        write_pdb(pdb_path, *record)
+    elif not _convert_with_rdkit(sdf_path, pdb_path):
+        return False
+
+    # Check the file actually landed
     if pdb_path.exists() and pdb_path.stat().st_size > 0:
         print(f"[OK] {sdf_path.name} -> {pdb_path}")
         return True
@@ -30,10 +116,12 @@ def main():
     if not sdf_files:
         print(f"[INFO] No SDF files in {SDF_DIR}")
         return
-    ok = 0
-    for sdf in sdf_files:
-        if convert_one(sdf):
-            ok += 1
+    # Files are independent, so convert them across processes
+    processes = min(os.cpu_count() or 1, len(sdf_files))
+    # Batch files per task, but never so many that some workers get nothing
+    chunksize = max(1, len(sdf_files) // processes)
+    with mp.Pool(processes=processes) as pool:
+        ok = sum(pool.imap_unordered(convert_one, sdf_files, chunksize=chunksize))
     print(f"[DONE] Converted {ok}/{len(sdf_files)} SDF to PDB in {OUT_DIR}")
 
 if __name__ == "__main__":
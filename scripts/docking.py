@@ -2,7 +2,18 @@
 
 import os
 import sys
+import csv
+import json
+import argparse
+import itertools
+import threading
 import subprocess
+import multiprocessing
+
+try:
+    import numpy  # bundled with MGLTools; vectorizes receptor coordinate parsing
+except ImportError:
+    numpy = None
 
 VINA_EXECUTABLE = r"C:\Program Files\AutoDock Vina\vina_1.2.7_win.exe"
 
@@ -10,11 +21,19 @@ BASE_DIR = "results/docking"
 RECEPTOR_DIR = os.path.join(BASE_DIR, "receptors")
 LIGAND_DIR   = os.path.join(BASE_DIR, "ligands")
 DOCKING_RESULTS_DIR = os.path.join(BASE_DIR, "vina_outputs")
+SUMMARY_CSV  = os.path.join(BASE_DIR, "docking_summary.csv")
+
+# DEBUG=1 runs Vina verbosely, echoing its output and keeping a per-run log next to each result.
+# Otherwise Vina runs quiet with stdout discarded; affinities are read from the output PDBQT either way.
+DEBUG = os.environ.get("DEBUG", "0") in ("1", "true", "True")
 
 # Fallback box if parsing fails (Angstroms)
 DEFAULT_CENTER = (0.0, 0.0, 0.0)
 DEFAULT_SIZE   = (24.0, 24.0, 24.0)
 
+# PDBQT records that carry receptor coordinates
+ATOM_PREFIXES = ("ATOM", "HETATM")
+
 # Optional manual boxes: receptor stem -> ((cx,cy,cz), (sx,sy,sz))
 MANUAL_BOX = {
     # "5CRB": ((11.9145, 38.904, 40.986), (28.0, 28.0, 28.0)),
@@ -23,27 +42,108 @@ MANUAL_BOX = {
 if not os.path.exists(DOCKING_RESULTS_DIR):
     os.makedirs(DOCKING_RESULTS_DIR)
 
+# Vina threads per run: None (Vina's default, all cores) for a single worker, otherwise an even
+# share of the cores per pool worker. Set per process by _set_vina_cpu.
+VINA_CPU = None
+
+def _set_vina_cpu(cpu):
+    global VINA_CPU
+    VINA_CPU = cpu
+
+# Receptor boxes already computed in this process: (path, mtime, margin, min_size, max_size) -> box
+_BOX_CACHE = {}
+
 def compute_box_from_receptor(receptor_pdbqt_path, margin=8.0, min_size=20.0, max_size=28.0):
-    """Build a search box from receptor coordinates."""
+    """
+    Build a search box from receptor coordinates. The box is memoized per process and
+    persisted to <receptor>.box.json, so other pool workers and later runs skip the parse.
+    """
+    try:
+        mtime = os.path.getmtime(receptor_pdbqt_path)
+    except OSError:
+        mtime = None
+    key = (os.path.abspath(receptor_pdbqt_path), mtime, margin, min_size, max_size)
+    if key not in _BOX_CACHE:
+        params = [margin, min_size, max_size]
+        box = _load_box_sidecar(receptor_pdbqt_path, params)
+        if box is None:
+            box = _compute_box_impl(receptor_pdbqt_path, margin, min_size, max_size)
+            if box is None:
+                print("[WARN] No receptor coords parsed; using DEFAULT box.")
+                box = DEFAULT_CENTER + DEFAULT_SIZE
+            else:
+                _save_box_sidecar(receptor_pdbqt_path, params, box)
+        _BOX_CACHE[key] = box
+    return _BOX_CACHE[key]
+
+def _load_box_sidecar(receptor_pdbqt_path, params):
+    """Box from <receptor>.box.json if it is not older than the receptor and used the same params."""
+    box_path = receptor_pdbqt_path + ".box.json"
+    try:
+        if os.path.getmtime(box_path) < os.path.getmtime(receptor_pdbqt_path):
+            return None
+        f = open(box_path)
+        try:
+            data = json.load(f)
+        finally:
+            f.close()
+        if data.get("params") != params:
+            return None
+        return tuple(float(v) for v in data["box"])
+    except (IOError, OSError, ValueError, KeyError, TypeError):
+        return None
+
+def _save_box_sidecar(receptor_pdbqt_path, params, box):
+    box_path = receptor_pdbqt_path + ".box.json"
+    tmp_path = "%s.%d.tmp" % (box_path, os.getpid())  # concurrent workers never share a temp file
+    try:
+        f = open(tmp_path, "w")
+        try:
+            json.dump({"params": params, "box": list(box)}, f)
+        finally:
+            f.close()
+        try:
+            os.rename(tmp_path, box_path)
+        except OSError:
+            # Windows will not rename over an existing file: replace a stale side-car, or
+            # drop ours if another worker got there first
+            try:
+                os.remove(box_path)
+                os.rename(tmp_path, box_path)
+            except OSError:
+                os.remove(tmp_path)
+    except (IOError, OSError) as e:
+        print("[WARN] Could not cache receptor box (%s): %s" % (box_path, e))
+
+def _parse_coords(atom_lines):
+    """Fixed-width x/y/z columns of ATOM/HETATM records -> (N, 3) array, or list of tuples without NumPy."""
+    if numpy is not None:
+        return numpy.array([(l[30:38], l[38:46], l[46:54]) for l in atom_lines]).astype(float).reshape(-1, 3)
+    return [(float(l[30:38]), float(l[38:46]), float(l[46:54])) for l in atom_lines]
+
+def _compute_box_impl(receptor_pdbqt_path, margin, min_size, max_size):
+    """(cx, cy, cz, sx, sy, sz) from the receptor's atoms, or None if no coordinates could be read."""
     coords = []
     try:
         f = open(receptor_pdbqt_path)
         try:
-            for line in f:
-                if line.startswith("ATOM") or line.startswith("HETATM"):
-                    try:
-                        x = float(line[30:38]); y = float(line[38:46]); z = float(line[46:54])
-                        coords.append((x, y, z))
-                    except:
-                        pass
+            # One C-level prefix check per line; the length check guarantees the coordinate columns exist
+            atom_lines = [line for line in f if len(line) >= 54 and line.startswith(ATOM_PREFIXES)]
         finally:
             f.close()
+        coords = _parse_coords(atom_lines)
     except Exception as e:
         print("[WARN] Could not read receptor coords (%s): %s" % (receptor_pdbqt_path, e))
 
-    if not coords:
-        print("[WARN] No receptor coords parsed; using DEFAULT box.")
-        return DEFAULT_CENTER + DEFAULT_SIZE
+    if len(coords) == 0:
+        return None
+
+    if numpy is not None and isinstance(coords, numpy.ndarray):
+        # Vectorized bounds; clip == max(min_size, min(extent + margin, max_size)) per axis
+        mn, mx = coords.min(axis=0), coords.max(axis=0)
+        center = (mn + mx) * 0.5
+        size = numpy.clip((mx - mn) + margin, min_size, max_size)
+        return tuple(center.tolist()) + tuple(size.tolist())
 
     xs, ys, zs = zip(*coords)
     min_x, max_x = min(xs), max(xs)
@@ -60,6 +160,21 @@ def compute_box_from_receptor(receptor_pdbqt_path, margin=8.0, min_size=20.0, ma
 
     return (cx, cy, cz, sx, sy, sz)
 
+def _stdout_bytes():
+    return getattr(sys.stdout, "buffer", sys.stdout)  # Py3 needs the binary buffer; Py2 stdout takes bytes
+
+def _tee(src, sinks, bufsize=65536):
+    """Copy a pipe to every sink in raw chunks until EOF."""
+    fd = src.fileno()
+    while True:
+        chunk = os.read(fd, bufsize)
+        if not chunk:
+            break
+        for sink in sinks:
+            sink.write(chunk)
+            sink.flush()
+    src.close()
+
 def run_docking(receptor_path, ligand_path):
     receptor_name = os.path.splitext(os.path.basename(receptor_path))[0]
     ligand_name   = os.path.splitext(os.path.basename(ligand_path))[0]
@@ -79,53 +194,77 @@ def run_docking(receptor_path, ligand_path):
         "--center_x", str(cx), "--center_y", str(cy), "--center_z", str(cz),
         "--size_x",   str(sx), "--size_y",   str(sy), "--size_z",   str(sz),
         "--exhaustiveness", "8",
-        "--verbosity", "2",
+        "--verbosity", "2" if DEBUG else "0",
         "--out", out_pdbqt,
     ]
+    if VINA_CPU:
+        cmd += ["--cpu", str(VINA_CPU)]  # keeps threads * pool workers <= CPU cores
 
     print("\nRunning docking: %s + %s" % (receptor_name, ligand_name))
     print(" Search box: center=(%.2f, %.2f, %.2f), size=(%.2f, %.2f, %.2f)" % (cx, cy, cz, sx, sy, sz))
 
     try:
-        # Capture stdout/stderr and tee to our own log
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
-        lf = open(log_file, "w")
-        try:
-            for line in p.stdout:
-                sys.stdout.write(line)
-                lf.write(line)
-        finally:
-            lf.close()
-        p.wait()
-        if p.returncode != 0:
-            print("[ERROR] Docking failed for %s + %s (exit %d)" % (receptor_name, ligand_name, p.returncode))
+        if DEBUG:
+            # Capture stdout/stderr; a reader thread tees raw chunks to the console and our own log
+            p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            lf = open(log_file, "wb")
+            try:
+                reader = threading.Thread(target=_tee, args=(p.stdout, [_stdout_bytes(), lf]))
+                reader.daemon = True
+                reader.start()
+                p.wait()
+                reader.join()
+            finally:
+                lf.close()
+            returncode = p.returncode
+        else:
+            # Nothing to parse from stdout; stderr stays attached so Vina's errors still surface
+            devnull = open(os.devnull, "wb")
+            try:
+                returncode = subprocess.call(cmd, stdout=devnull)
+            finally:
+                devnull.close()
+        if returncode != 0:
+            print("[ERROR] Docking failed for %s + %s (exit %d)" % (receptor_name, ligand_name, returncode))
             return None
         print("[OK] Docking complete. Output: %s" % out_pdbqt)
-        return log_file
+        return out_pdbqt
     except OSError as e:
         print("[ERROR] Could not execute Vina at '%s': %s" % (VINA_EXECUTABLE, e))
         return None
 
-def parse_binding_affinity(log_file):
-    """Parse 'REMARK VINA RESULT:' from our captured log (if present)."""
+def parse_binding_affinity(out_pdbqt):
+    """Parse the best pose's 'REMARK VINA RESULT:' line, which Vina writes at the top of its output PDBQT."""
     affinity = None
     try:
-        f = open(log_file)
+        f = open(out_pdbqt)
         try:
-            for line in f:
-                s = line.strip()
-                if s.startswith("REMARK VINA RESULT:"):
-                    parts = s.split()
-                    if len(parts) >= 4:
-                        affinity = float(parts[3])
-                    break
+            head = f.read(2048)
         finally:
             f.close()
+        i = head.find("REMARK VINA RESULT:")
+        if i >= 0:
+            parts = head[i:].split(None, 4)
+            if len(parts) >= 4:
+                affinity = float(parts[3])
     except Exception as e:
-        print("[WARN] Could not parse affinity from %s: %s" % (log_file, e))
+        print("[WARN] Could not parse affinity from %s: %s" % (out_pdbqt, e))
     return affinity
 
+def _dock_pair(job):
+    """Pool worker: dock one (receptor, ligand) pair -> (rec, lig, affinity) or None."""
+    rec, lig = job
+    out_path = run_docking(rec, lig)
+    if not out_path:
+        return None
+    return (os.path.basename(rec), os.path.basename(lig), parse_binding_affinity(out_path))
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dock every receptor against every ligand with AutoDock Vina.")
+    parser.add_argument("--jobs", type=int, default=multiprocessing.cpu_count(),
+                        help="number of Vina runs in parallel (default: CPU count)")
+    args = parser.parse_args()
+
     if not os.path.exists(VINA_EXECUTABLE):
         sys.stderr.write("[ERROR] Vina executable not found at: %s\n" % VINA_EXECUTABLE); sys.exit(1)
     if not os.path.isdir(RECEPTOR_DIR) or not os.path.isdir(LIGAND_DIR):
@@ -138,17 +277,35 @@ if __name__ == "__main__":
     if not ligands:
         sys.stderr.write("[ERROR] No ligand PDBQT files found in %s\n" % LIGAND_DIR); sys.exit(1)
 
-    results = []
-    for rec in receptors:
-        for lig in ligands:
-            log_path = run_docking(rec, lig)
-            if log_path:
-                aff = parse_binding_affinity(log_path)
-                results.append((os.path.basename(rec), os.path.basename(lig), aff))
-
-    print("\n=== Docking Summary ===")
-    print("{:<30} {:<30} {:>20}".format('Protein', 'Ligand', 'Affinity (kcal/mol)'))
-    print("-" * 80)
-    for rec, lig, aff in results:
-        aff_str = ("%.2f" % aff) if (aff is not None) else "N/A"
-        print("{:<30} {:<30} {:>20}".format(rec, lig, aff_str))
+    jobs = list(itertools.product(receptors, ligands))
+    n_workers = max(1, min(args.jobs, len(jobs)))
+    print("Docking %d receptor/ligand pairs with %d parallel job(s)" % (len(jobs), n_workers))
+
+    if n_workers > 1:
+        vina_cpu = max(1, multiprocessing.cpu_count() // n_workers)
+        pool = multiprocessing.Pool(processes=n_workers, initializer=_set_vina_cpu, initargs=(vina_cpu,))
+        try:
+            outcomes = pool.map(_dock_pair, jobs, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        outcomes = [_dock_pair(job) for job in jobs]
+    results = [r for r in outcomes if r is not None]
+
+    # Build the whole summary first and emit it with a single write
+    rows = ["{:<30} {:<30} {:>20}".format(rec, lig, ("%.2f" % aff) if (aff is not None) else "N/A")
+            for rec, lig, aff in results]
+    header = ["\n=== Docking Summary ===",
+              "{:<30} {:<30} {:>20}".format('Protein', 'Ligand', 'Affinity (kcal/mol)'),
+              "-" * 80]
+    sys.stdout.write("\n".join(header + rows) + "\n")
+
+    fh = open(SUMMARY_CSV, "w", newline="") if sys.version_info[0] >= 3 else open(SUMMARY_CSV, "wb")
+    try:
+        writer = csv.writer(fh)
+        writer.writerow(["Protein", "Ligand", "Affinity (kcal/mol)"])
+        writer.writerows(results)
+    finally:
+        fh.close()
+    print("Summary saved to %s" % SUMMARY_CSV)
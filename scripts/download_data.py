@@ -1,5 +1,25 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
+
+MAX_WORKERS = 16
+TIMEOUT = 30  # seconds per request
+CHUNK_SIZE = 1 << 16  # bytes per streamed write
+# PubChem allows at most 5 requests/second and answers bursts with 503, so its
+# lookups get their own small pool, and throttled requests are retried with backoff
+PUBCHEM_WORKERS = 4
+RETRY_STATUS = (429, 503)
+RETRIES = 4
+BACKOFF = 1.0  # seconds before the first retry, doubled each time
+
+# One keep-alive session shared by all download threads
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+session.mount('https://', _adapter)
+session.mount('http://', _adapter)
 
 # Create directories for files
 os.makedirs('data/proteins', exist_ok=True)
@@ -28,58 +48,97 @@ ligands = {
     'MEROPENEM': None,
 }
 
+def fetch(url, stream=False):
+    """session.get that backs off and retries while the server is rate limiting (429/503)."""
+    for attempt in range(RETRIES + 1):
+        r = session.get(url, stream=stream, timeout=TIMEOUT)
+        if r.status_code not in RETRY_STATUS or attempt == RETRIES:
+            return r
+        r.close()
+        time.sleep(BACKOFF * 2 ** attempt)
+
+def save_streamed(url, path):
+    """
+    Stream the response body to path in CHUNK_SIZE pieces. The body goes to path + '.part'
+    and only replaces path once complete, so a dropped connection never leaves a truncated
+    file behind. Raises requests.RequestException (incl. HTTPError on a bad status) or OSError.
+    """
+    part = path + '.part'
+    try:
+        # iter_content (unlike r.raw) also undoes gzip transfer encoding
+        with fetch(url, stream=True) as r:
+            r.raise_for_status()
+            with open(part, 'wb') as f:
+                for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+        os.replace(part, path)
+    except BaseException:
+        try:
+            os.remove(part)
+        except OSError:
+            pass
+        raise
+
 def download_pdb(pdb_id):
     url = f'https://files.rcsb.org/download/{pdb_id}.pdb'
     print(f"Downloading PDB for {pdb_id}...")
-    r = requests.get(url)
-    if r.status_code == 200:
-        path = os.path.join('data', 'proteins', f'{pdb_id}.pdb')
-        with open(path, 'wb') as f:
-            f.write(r.content)
+    path = os.path.join('data', 'proteins', f'{pdb_id}.pdb')
+    try:
+        save_streamed(url, path)
         print(f"Saved {path}")
-    else:
-        print(f"Failed to download PDB {pdb_id}")
+    except (requests.RequestException, OSError) as e:
+        print(f"Failed to download PDB {pdb_id}: {e}")
 
 def get_pubchem_cid(drug_name):
     url = f'https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/name/{drug_name}/cids/JSON'
     print(f"Searching CID for {drug_name}...")
-    r = requests.get(url)
-    if r.status_code == 200:
-        data = r.json()
-        cids = data.get('IdentifierList', {}).get('CID', [])
-        if cids:
-            return cids[0]
+    try:
+        r = fetch(url)
+        if r.status_code == 200:
+            data = r.json()
+            cids = data.get('IdentifierList', {}).get('CID', [])
+            if cids:
+                return cids[0]
+    except (requests.RequestException, OSError, ValueError) as e:
+        print(f"CID lookup failed for {drug_name}: {e}")
+        return None
     print(f"CID not found for {drug_name}")
     return None
 
 def download_sdf(cid, drug_name):
     url = f'https://pubchem.ncbi.nlm.nih.gov/rest/pug/compound/cid/{cid}/SDF?record_type=3d'
     print(f"Downloading SDF for CID {cid} ({drug_name})...")
-    r = requests.get(url)
-    if r.status_code == 200:
-        path = os.path.join('data', 'ligands', f'{drug_name}.sdf')
-        with open(path, 'wb') as f:
-            f.write(r.content)
+    path = os.path.join('data', 'ligands', f'{drug_name}.sdf')
+    try:
+        save_streamed(url, path)
         print(f"Saved {path}")
+    except (requests.RequestException, OSError) as e:
+        print(f"Failed to download SDF for {drug_name}: {e}")
+
+def resolve_and_download(drug):
+    cid = get_pubchem_cid(drug)
+    if cid:
+        download_sdf(cid, drug)
     else:
-        print(f"Failed to download SDF for {drug_name}")
+        print(f"Skipping {drug} due to missing CID")
 
 def main():
-    # Download protein PDB files
-    for protein, pdb_id in protein_pdb_map.items():
-        download_pdb(pdb_id)
-
-    # Download ligand files (skip antibodies)
+    # Skip antibodies for ligand download
     antibodies = ['CANAKINUMAB', 'GOLIMUMAB']
+    drugs = []
     for drug in ligands.keys():
         if drug.upper() in antibodies:
             print(f"Skipping antibody ligand {drug}")
-            continue
-        cid = get_pubchem_cid(drug)
-        if cid:
-            download_sdf(cid, drug)
         else:
-            print(f"Skipping {drug} due to missing CID")
+            drugs.append(drug)
+
+    # Requests are network-bound, so fetch everything concurrently (PubChem at its own, lower rate)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as ex, \
+            ThreadPoolExecutor(max_workers=PUBCHEM_WORKERS) as pubchem:
+        jobs = [ex.submit(download_pdb, pdb_id) for pdb_id in protein_pdb_map.values()]
+        jobs += [pubchem.submit(resolve_and_download, drug) for drug in drugs]
+        for job in jobs:
+            job.result()
 
 if __name__ == '__main__':
     main()
@@ -1,41 +1,43 @@
 import os
 import csv
 
-LOG_DIR = "results/docking/vina_outputs"
+VINA_OUT_DIR = "results/docking/vina_outputs"
+OUT_SUFFIX = "_out.pdbqt"
 OUTPUT_CSV = "results/binding_energies.csv"
 
-def parse_binding_affinity(log_file):
+def parse_binding_affinity(out_pdbqt):
+    """Best-pose affinity from the 'REMARK VINA RESULT:' line at the top of a Vina output PDBQT."""
     affinity = None
     try:
-        with open(log_file) as f:
-            for line in f:
-                if line.strip().startswith("REMARK VINA RESULT:"):
-                    parts = line.strip().split()
-                    affinity = float(parts[3])
-                    break
-    except Exception, e:
-        print("[WARN] Could not parse %s: %s" % (log_file, e))
+        with open(out_pdbqt) as f:
+            head = f.read(2048)
+        i = head.find("REMARK VINA RESULT:")
+        if i >= 0:
+            affinity = float(head[i:].split(None, 4)[3])
+    except Exception as e:
+        print("[WARN] Could not parse %s: %s" % (out_pdbqt, e))
     return affinity
 
 def main():
-    if not os.path.exists(LOG_DIR):
-        print("[ERROR] Log directory %s not found." % LOG_DIR)
+    if not os.path.exists(VINA_OUT_DIR):
+        print("[ERROR] Vina output directory %s not found." % VINA_OUT_DIR)
         return
 
-    log_files = [f for f in os.listdir(LOG_DIR) if f.endswith(".log")]
-    if not log_files:
-        print("[INFO] No log files found in %s" % LOG_DIR)
+    out_files = sorted(f for f in os.listdir(VINA_OUT_DIR) if f.endswith(OUT_SUFFIX))
+    if not out_files:
+        print("[INFO] No *%s files found in %s" % (OUT_SUFFIX, VINA_OUT_DIR))
         return
 
     results = []
-    for log_file in log_files:
-        full_path = os.path.join(LOG_DIR, log_file)
+    for out_file in out_files:
+        full_path = os.path.join(VINA_OUT_DIR, out_file)
         affinity = parse_binding_affinity(full_path)
         # split protein and ligand by __ separator in filename
+        stem = out_file[:-len(OUT_SUFFIX)]
         try:
-            protein, ligand = log_file.replace(".log", "").split("__")
+            protein, ligand = stem.split("__")
         except ValueError:
-            protein = ligand = log_file.replace(".log", "")
+            protein = ligand = stem
         results.append([protein, ligand, affinity])
 
     if not os.path.exists(os.path.dirname(OUTPUT_CSV)):
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Persistent MGLTools (Python 2) worker used by prepare_inputs.py.
+
+Reads one JSON job per stdin line:
+    {"script": <Utilities24 script path>, "args": [...], "cwd": <dir or null>}
+runs the script in-process as __main__ and answers "OK", "ERR exit <code>" or
+"ERR <reason>" on stdout. Everything else, tool output and tracebacks included, goes to stderr.
+AutoDockTools/MolKit are imported by the first job and stay loaded for the rest.
+"""
+
+import os
+import sys
+import json
+import runpy
+import traceback
+
+def run_job(job):
+    old_argv, old_cwd = sys.argv, os.getcwd()
+    sys.argv = [job["script"]] + list(job.get("args") or [])
+    try:
+        if job.get("cwd"):
+            os.chdir(job["cwd"])
+        try:
+            runpy.run_path(job["script"], run_name="__main__")
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                if e.code != 0:
+                    return "ERR exit %d" % e.code
+            elif e.code is not None:  # sys.exit("message") exits with status 1
+                return "ERR exit 1: %s" % e.code
+        return "OK"
+    except Exception as e:
+        traceback.print_exc()
+        return "ERR %s: %s" % (e.__class__.__name__, e)
+    finally:
+        sys.argv = old_argv
+        os.chdir(old_cwd)
+
+def main():
+    # Keep a private copy of fd 1 for replies, then point fd 1 at stderr so nothing the
+    # tools write (C extensions and child processes included) can reach the reply channel
+    sys.stdout.flush()
+    reply = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+    while True:
+        line = sys.stdin.readline()
+        if not line:
+            break
+        line = line.strip()
+        if not line:
+            continue
+        status = run_job(json.loads(line))
+        reply.write(status.replace("\n", " ") + "\n")
+        reply.flush()
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,11 @@ import os
 import sys
 import subprocess
 import glob
+import json
+import hashlib
+import threading
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 
 # =======================
 # Base paths anchored to this script's folder
@@ -19,6 +24,7 @@ def A(*parts):
 # =======================
 MGLTOOLS_PYTHON    = r"C:\Program Files (x86)\MGLTools-1.5.7\python.exe"
 MGLTOOLS_UTILS_DIR = r"C:\Program Files (x86)\MGLTools-1.5.7\Lib\site-packages\AutoDockTools\Utilities24"
+MGL_WORKER         = A("mgl_worker.py")  # persistent MGLTools interpreter fed over stdin
 
 # Input folders (both are searched; ligands_pdb takes priority if both contain same stem)
 INPUT_PROTEIN_DIR  = A("data", "proteins")
@@ -28,17 +34,19 @@ INPUT_LIGAND_DIRS  = [A("data", "ligands_pdb"), A("data", "ligands")]  # order m
 OUTPUT_DIR            = A("results", "docking")
 OUTPUT_RECEPTOR_DIR   = A("results", "docking", "receptors")
 OUTPUT_LIGAND_DIR     = A("results", "docking", "ligands")
+ALTLOC_SPLIT_DIR      = A("results", "docking", "altloc")  # split alt-loc PDBs; kept out of the input dir
 
 # Behavior
 FORCE_REBUILD       = os.environ.get("FORCE_REBUILD", "0") in ("1", "true", "True")
 LIGAND_ADD_FLAG     = os.environ.get("LIGAND_ADD_FLAG", "checkhydrogens")  # or "hydrogens"
 RECEPTOR_CLEAN_FLAG = os.environ.get("RECEPTOR_CLEAN_FLAG", "nphs_lps_waters")  # cleanup for receptor
+PREP_JOBS           = max(1, int(os.environ.get("PREP_JOBS", "0")) or multiprocessing.cpu_count())  # parallel MGLTools runs
 
 # =======================
 # Helpers
 # =======================
 def _ensure_dirs():
-    for d in [OUTPUT_DIR, OUTPUT_RECEPTOR_DIR, OUTPUT_LIGAND_DIR]:
+    for d in [OUTPUT_DIR, OUTPUT_RECEPTOR_DIR, OUTPUT_LIGAND_DIR, ALTLOC_SPLIT_DIR]:
         if not os.path.exists(d):
             os.makedirs(d)
 
@@ -51,6 +59,72 @@ def _check_tools():
     for p in [prep_rec, prep_lig, split_alt]:
         if not os.path.isfile(p):
             sys.stderr.write("[ERROR] Missing utility under %s: %s\n" % (MGLTOOLS_UTILS_DIR, os.path.basename(p))); sys.exit(1)
+    if not os.path.isfile(MGL_WORKER):
+        sys.stderr.write("[ERROR] Missing worker script: %s\n" % MGL_WORKER); sys.exit(1)
+
+class _MglWorker(object):
+    """One long-lived MGLTools interpreter running mgl_worker.py; handles one job at a time."""
+    def __init__(self):
+        self.proc = subprocess.Popen([MGLTOOLS_PYTHON, MGL_WORKER],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+
+    def run(self, script, args, cwd=None):
+        self.proc.stdin.write(json.dumps({"script": script, "args": args, "cwd": cwd}) + "\n")
+        self.proc.stdin.flush()
+        reply = self.proc.stdout.readline().strip()
+        if not reply:
+            raise OSError("MGLTools worker exited (code %s)" % self.proc.poll())
+        if reply != "OK":
+            reason = reply[4:] if reply.startswith("ERR ") else reply
+            code = 1
+            if reason.startswith("exit "):
+                try:
+                    code = int(reason.split()[1].rstrip(":"))
+                except ValueError:
+                    pass
+            raise subprocess.CalledProcessError(code, [os.path.basename(script)] + list(args), output=reason)
+
+    def close(self):
+        try:
+            self.proc.stdin.close()
+        except (IOError, OSError):
+            pass
+        self.proc.wait()
+
+_local = threading.local()
+_all_workers = []
+_workers_lock = threading.Lock()
+
+def _run_mgl(script_name, args, cwd=None):
+    """
+    Run a Utilities24 script on this thread's persistent MGLTools worker, so the
+    Python 2 + AutoDockTools startup is paid once per thread instead of once per file.
+    Raises CalledProcessError on failure and OSError if the worker cannot run.
+    """
+    worker = getattr(_local, "worker", None)
+    if worker is None:
+        worker = _local.worker = _MglWorker()
+        with _workers_lock:
+            _all_workers.append(worker)
+    try:
+        worker.run(os.path.join(MGLTOOLS_UTILS_DIR, script_name), args, cwd)
+    except (IOError, OSError):
+        _local.worker = None  # the next job on this thread starts a fresh worker
+        raise
+
+_print_lock = threading.Lock()
+
+def _say(msg):
+    """print() for pool threads: Python 2 print writes text and newline separately, so lines can interleave."""
+    with _print_lock:
+        sys.stdout.write(msg + "\n")
+        sys.stdout.flush()
+
+def _close_workers():
+    with _workers_lock:
+        for worker in _all_workers:
+            worker.close()
+        del _all_workers[:]
 
 def _list_files(dirname, exts):
     if not os.path.isdir(dirname):
@@ -58,6 +132,15 @@ def _list_files(dirname, exts):
     exts = tuple([e.lower() for e in exts])
     return [f for f in os.listdir(dirname) if f and f[0] != '.' and f.lower().endswith(exts)]
 
+def _is_split_altloc(fname):
+    """Splitter output (<stem>_split.pdb_A.pdb etc.), left in the input dir by older runs."""
+    return "_split.pdb" in fname
+
+def _receptor_paths():
+    """Receptor PDBs in INPUT_PROTEIN_DIR, excluding alt-loc split outputs."""
+    proteins = [f for f in _list_files(INPUT_PROTEIN_DIR, (".pdb", ".PDB")) if not _is_split_altloc(f)]
+    return [os.path.join(INPUT_PROTEIN_DIR, f) for f in sorted(proteins)]
+
 def _unique_ligand_paths():
     """
     Return a list of absolute ligand paths with unique stems,
@@ -80,15 +163,14 @@ def _maybe_split_altloc(pdb_path):
     base = os.path.splitext(os.path.basename(pdb_path))[0]  # e.g., 5CRB
     # Output naming observed from MGLTools on Windows:
     #   <stem>_split.pdb_A.pdb and <stem>_split.pdb_B.pdb
-    # The splitter is idempotent; running again just rewrites.
-    split_prefix = os.path.join(os.path.dirname(pdb_path), base + "_split.pdb")
+    # The splitter is idempotent; running again just rewrites. Outputs go to ALTLOC_SPLIT_DIR,
+    # never next to the inputs, so concurrent receptors never see each other's split files.
+    split_prefix = os.path.join(ALTLOC_SPLIT_DIR, base + "_split.pdb")
     split_A = split_prefix + "_A.pdb"
     split_B = split_prefix + "_B.pdb"
 
     try:
-        subprocess.check_call([
-            MGLTOOLS_PYTHON,
-            os.path.join(MGLTOOLS_UTILS_DIR, "prepare_pdb_split_alt_confs.py"),
+        _run_mgl("prepare_pdb_split_alt_confs.py", [
             "-r", pdb_path,
             "-o", split_prefix  # tool appends _A/_B itself
         ])
@@ -102,7 +184,7 @@ def _maybe_split_altloc(pdb_path):
     if os.path.isfile(split_B):
         return split_B
 
-    matches = glob.glob(os.path.join(os.path.dirname(pdb_path), base + "_split*.pdb"))
+    matches = glob.glob(os.path.join(ALTLOC_SPLIT_DIR, base + "_split*.pdb"))
     if matches:
         # pick the newest split file
         matches.sort(key=lambda p: os.path.getmtime(p), reverse=True)
@@ -110,46 +192,80 @@ def _maybe_split_altloc(pdb_path):
 
     return pdb_path
 
+def _input_digest(path, *flags):
+    """sha256 of an input file plus the flags that shape its PDBQT."""
+    h = hashlib.sha256()
+    f = open(path, "rb")
+    try:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    finally:
+        f.close()
+    for flag in flags:
+        h.update(b"\0" + flag.encode("utf-8"))
+    return h.hexdigest()
+
+def _is_up_to_date(out_pdbqt, digest):
+    """True if out_pdbqt exists and its .sha256 side-car matches the current input digest."""
+    if FORCE_REBUILD or not os.path.isfile(out_pdbqt):
+        return False
+    try:
+        f = open(out_pdbqt + ".sha256")
+        try:
+            return f.read().strip() == digest
+        finally:
+            f.close()
+    except IOError:
+        return False
+
+def _record_digest(out_pdbqt, digest):
+    f = open(out_pdbqt + ".sha256", "w")
+    try:
+        f.write(digest + "\n")
+    finally:
+        f.close()
+
 # =======================
 # Preparers
 # =======================
 def prepare_receptor(pdb_file_path):
     """Convert receptor PDB -> PDBQT with alt-loc handling and cleanup."""
     if not os.path.exists(pdb_file_path):
-        print("[ERROR] Protein not found: %s" % pdb_file_path); return False
+        _say("[ERROR] Protein not found: %s" % pdb_file_path); return False
 
     pdb_file_path = os.path.abspath(pdb_file_path)
     file_name = os.path.basename(pdb_file_path)
 
-    # Split alt conformers if any; prefer the A conformer
-    split_pdb = _maybe_split_altloc(pdb_file_path)
-    if split_pdb != pdb_file_path:
-        print("[INFO] Using split alt-loc file: %s" % os.path.basename(split_pdb))
-
     # Output name follows the original stem (not the split suffix)
     out_name = os.path.splitext(file_name)[0] + ".pdbqt"
     out_pdbqt = os.path.join(OUTPUT_RECEPTOR_DIR, out_name)
 
-    if (not FORCE_REBUILD) and os.path.isfile(out_pdbqt):
-        print("[SKIP] Receptor exists -> %s" % out_pdbqt)
+    # Unchanged input since the last build -> skip both MGLTools steps
+    digest = _input_digest(pdb_file_path, RECEPTOR_CLEAN_FLAG)
+    if _is_up_to_date(out_pdbqt, digest):
+        _say("[SKIP] Receptor up to date -> %s" % out_pdbqt)
         return True
 
-    cmd = [
-        MGLTOOLS_PYTHON,
-        os.path.join(MGLTOOLS_UTILS_DIR, "prepare_receptor4.py"),
+    # Split alt conformers if any; prefer the A conformer
+    split_pdb = _maybe_split_altloc(pdb_file_path)
+    if split_pdb != pdb_file_path:
+        _say("[INFO] Using split alt-loc file: %s" % os.path.basename(split_pdb))
+
+    args = [
         "-r", split_pdb,
         "-o", out_pdbqt,
         "-A", "hydrogens",
         "-U", RECEPTOR_CLEAN_FLAG
     ]
     try:
-        subprocess.check_call(cmd)
-        print("[OK] Receptor -> %s" % out_pdbqt)
+        _run_mgl("prepare_receptor4.py", args)
+        _record_digest(out_pdbqt, digest)
+        _say("[OK] Receptor -> %s" % out_pdbqt)
         return True
     except subprocess.CalledProcessError as e:
-        print("[ERROR] prepare_receptor failed for %s: %s" % (file_name, e)); return False
+        _say("[ERROR] prepare_receptor failed for %s: %s" % (file_name, e.output)); return False
     except OSError as e:
-        print("[ERROR] Could not run MGLTools: %s" % e); return False
+        _say("[ERROR] Could not run MGLTools: %s" % e); return False
 
 def prepare_ligand(ligand_file_path):
     """
@@ -158,7 +274,7 @@ def prepare_ligand(ligand_file_path):
     Use ABSOLUTE output path so cwd changes don't break the -o destination.
     """
     if not os.path.exists(ligand_file_path):
-        print("[ERROR] Ligand not found: %s" % ligand_file_path); return False
+        _say("[ERROR] Ligand not found: %s" % ligand_file_path); return False
 
     ligand_file_path = os.path.abspath(ligand_file_path)
     lig_dir  = os.path.dirname(ligand_file_path)
@@ -166,28 +282,28 @@ def prepare_ligand(ligand_file_path):
     base     = os.path.splitext(fname)[0]
     out_pdbqt = os.path.join(OUTPUT_LIGAND_DIR, "%s.pdbqt" % base)  # ABSOLUTE
 
-    if (not FORCE_REBUILD) and os.path.isfile(out_pdbqt):
-        print("[SKIP] Ligand exists -> %s" % out_pdbqt)
+    digest = _input_digest(ligand_file_path, LIGAND_ADD_FLAG)
+    if _is_up_to_date(out_pdbqt, digest):
+        _say("[SKIP] Ligand up to date -> %s" % out_pdbqt)
         return True
 
     if not os.path.exists(OUTPUT_LIGAND_DIR):
         os.makedirs(OUTPUT_LIGAND_DIR)
 
-    cmd = [
-        MGLTOOLS_PYTHON,
-        os.path.join(MGLTOOLS_UTILS_DIR, "prepare_ligand4.py"),
+    args = [
         "-l", fname,                 # basename only (MolKit friendly)
         "-o", out_pdbqt,             # absolute output path
         "-A", LIGAND_ADD_FLAG        # default: checkhydrogens (override via env)
     ]
     try:
-        subprocess.check_call(cmd, cwd=lig_dir)
-        print("[OK] Ligand  -> %s" % out_pdbqt)
+        _run_mgl("prepare_ligand4.py", args, cwd=lig_dir)
+        _record_digest(out_pdbqt, digest)
+        _say("[OK] Ligand  -> %s" % out_pdbqt)
         return True
     except subprocess.CalledProcessError as e:
-        print("[ERROR] prepare_ligand failed for %s: %s" % (fname, e)); return False
+        _say("[ERROR] prepare_ligand failed for %s: %s" % (fname, e.output)); return False
     except OSError as e:
-        print("[ERROR] Could not run MGLTools: %s" % e); return False
+        _say("[ERROR] Could not run MGLTools: %s" % e); return False
 
 # =======================
 # Main
@@ -199,26 +315,32 @@ if __name__ == "__main__":
 
     # Receptors
     print("\nProcessing protein files from: %s" % INPUT_PROTEIN_DIR)
-    proteins = _list_files(INPUT_PROTEIN_DIR, (".pdb", ".PDB"))
-    if not proteins:
+    protein_paths = _receptor_paths()
+    if not protein_paths:
         print("[INFO] No .pdb files found in %s." % INPUT_PROTEIN_DIR)
-    ok_rec = 0
-    for f in sorted(proteins):
-        if prepare_receptor(os.path.join(INPUT_PROTEIN_DIR, f)): ok_rec += 1
 
     # Ligands (merge from both folders)
     print("\nProcessing ligand files from (priority): %s" % " , ".join(INPUT_LIGAND_DIRS))
     ligand_paths = _unique_ligand_paths()
     if not ligand_paths:
         print("[INFO] No ligand files (.pdb/.mol2/.sdf) found in %s." % " , ".join(INPUT_LIGAND_DIRS))
-    ok_lig = 0
-    for p in ligand_paths:
-        if prepare_ligand(p): ok_lig += 1
+
+    # Each file is an independent MGLTools subprocess, so threads are enough to run them side by side
+    pool = ThreadPool(PREP_JOBS)
+    try:
+        rec_jobs = pool.map_async(prepare_receptor, protein_paths)
+        lig_jobs = pool.map_async(prepare_ligand, ligand_paths)
+        ok_rec = sum(rec_jobs.get())
+        ok_lig = sum(lig_jobs.get())
+    finally:
+        pool.close()
+        pool.join()
+        _close_workers()
 
     # Summary & exit code
     print("\n--- File Preparation Complete ---")
-    print("Receptors prepared: %d / %d  ->  %s" % (ok_rec, len(proteins), OUTPUT_RECEPTOR_DIR))
+    print("Receptors prepared: %d / %d  ->  %s" % (ok_rec, len(protein_paths), OUTPUT_RECEPTOR_DIR))
     print("Ligands prepared:   %d / %d  ->  %s" % (ok_lig, len(ligand_paths), OUTPUT_LIGAND_DIR))
-    if (ok_rec == 0 and len(proteins) > 0) or (ok_lig == 0 and len(ligand_paths) > 0):
+    if (ok_rec == 0 and len(protein_paths) > 0) or (ok_lig == 0 and len(ligand_paths) > 0):
         # If nothing succeeded while inputs existed, return non-zero so the pipeline can stop early
         sys.exit(2)
@@ -4,7 +4,7 @@ Unified docking pipeline runner (Python).
 - Uses MGLTools Python (2.x) for: prepare_inputs.py, docking.py, extract_results.py
 - Uses Python 3 (vizdock env) for: check_install_packages.py, visualize.py
 - Uses the current Python (sys.executable) for the downloader (download_data.py OR downlaod_inputs.py)
-Writes both console output and a timestamped log file.
+Stage progress goes to the console and a timestamped log file; each stage's own output goes to the log file only.
 """
 
 
@@ -12,7 +12,7 @@ Writes both console output and a timestamped log file.
 import os
 import sys
 import time
-import subprocess
+import asyncio
 from pathlib import Path
 
 # ======= CONFIGURE THESE PATHS =======
@@ -42,28 +42,47 @@ def log(msg: str) -> None:
     with open(LOGFILE, "a", encoding="utf-8") as f:
         f.write(msg + "\n")
 
-def run_cmd(cmd, cwd=None) -> None:
-    """Run a command, stream & tee its output to the log; abort on nonzero exit."""
-    log(f">>> Running: {' '.join(map(str, cmd))}")
-    p = subprocess.Popen(
-        cmd,
-        cwd=cwd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        text=True,
-        universal_newlines=True,
-    )
-    # Stream output line-by-line to console and log
-    with open(LOGFILE, "a", encoding="utf-8") as lf:
-        for line in p.stdout:
-            line = line.rstrip("\n")
-            print(line)
-            lf.write(line + "\n")
-    p.wait()
-    if p.returncode != 0:
-        log(f"[ERROR] Command failed with code {p.returncode}: {' '.join(map(str, cmd))}")
-        sys.exit(p.returncode)
+class StageFailed(Exception):
+    """A pipeline stage exited nonzero; carries its exit code."""
+    def __init__(self, returncode: int):
+        super().__init__(f"stage exited with code {returncode}")
+        self.returncode = returncode
 
+async def run_cmd(cmd, cwd=None) -> None:
+    """Run a command, appending its output to the log file; raise StageFailed on nonzero exit."""
+    log(f">>> Running: {' '.join(map(str, cmd))}")
+    # The child's output comes back over a pipe and only this process writes the log, so
+    # concurrent stages can't overwrite each other (children sharing one file handle can on Windows).
+    p = await asyncio.create_subprocess_exec(*map(str, cmd), cwd=cwd,
+                                             stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+    try:
+        with open(LOGFILE, "ab") as lf:
+            pending = b""
+            while True:
+                chunk = await p.stdout.read(1 << 16)
+                if not chunk:
+                    break
+                # Append whole lines only, so lines from stages running side by side don't mix
+                pending += chunk
+                cut = pending.rfind(b"\n") + 1
+                if cut:
+                    lf.write(pending[:cut])
+                    lf.flush()
+                    pending = pending[cut:]
+            if pending:
+                lf.write(pending + b"\n")
+        returncode = await p.wait()
+    except asyncio.CancelledError:
+        p.kill()  # a sibling stage failed; don't leave this one running
+        raise
+    if returncode != 0:
+        log(f"[ERROR] Command failed with code {returncode}: {' '.join(map(str, cmd))}")
+        log(f"        See {LOGFILE} for its output.")
+        raise StageFailed(returncode)
+
+async def stage(msg: str, cmd) -> None:
+    log(msg)
+    await run_cmd(cmd)
 
 # def main():
 #     # Always run from the script's folder so relative paths work
@@ -75,7 +94,7 @@ def run_cmd(cmd, cwd=None) -> None:
 #     log("=" * 40)
 
 #     # 1) Downloader (prefer canonical name, fall back to the misspelled one)
-#     log("[1/7] Downloading protein and ligand data...")
+#     log("[1/8] Downloading protein and ligand data...")
 #     dl = None
 #     if Path("download_data.py").exists():
 #         dl = "download_data.py"
@@ -107,22 +126,22 @@ def run_cmd(cmd, cwd=None) -> None:
 #         sys.exit(1)
 
 #     # 4) Extract results (MGLTools Python 2)
-#     log("[4/7] Extracting docking results...")
+#     log("[6/8] Extracting docking results...")
 #     run_cmd([MGLTOOLS_PY, "extract_results.py"])
 
 #     # 5) Check/install packages in Python 3 env
-#     log("[5/7] Checking/installing missing Python packages (Py3 env)...")
+#     log("[2/8] Checking/installing missing Python packages (Py3 env)...")
 #     if not Path(VIZDOCK_PY3).exists():
 #         log(f"ERROR: Python 3 (vizdock) not found at: {VIZDOCK_PY3}")
 #         sys.exit(1)
 #     run_cmd([VIZDOCK_PY3, "check_install_packages.py"])
 
 #     # 6) Visualization (Python 3 env)
-#     log("[6/7] Running visualization (Py3 env)...")
+#     log("[7/8] Running visualization (Py3 env)...")
 #     run_cmd([VIZDOCK_PY3, "visualize.py", "data/ligands", str(OUTPUT_DIR), str(VIS_DIR)])
 
 #     # Done
-#     log("[7/7] Workflow completed successfully!")
+#     log("[8/8] Workflow completed successfully!")
 #     log(f"Log saved to {LOGFILE}")
 
 # if __name__ == "__main__":
@@ -134,6 +153,43 @@ def run_cmd(cmd, cwd=None) -> None:
 #     except Exception as e:
 #         log(f"[FATAL] {e}")
 #         sys.exit(1)
+async def run_pipeline(dl: str) -> None:
+    """
+    Stages run as soon as their inputs exist:
+      download || dependency check  ->  convert  ->  prepare  ->  dock  ->  extract || visualize
+    The dependency check must finish before the Py3 env is used (convert), and
+    extraction and visualization both only read the docking outputs.
+    """
+    await asyncio.gather(
+        stage("[1/8] Downloading protein and ligand data...", [sys.executable, dl]),
+        stage("[2/8] Checking/installing missing Python packages (Py3 env)...",
+              [VIZDOCK_PY3, "check_install_packages.py"]),
+    )
+
+    # 3) Convert SDF -> PDB (RDKit, Python 3 env)
+    await stage("[3/8] Converting ligand SDF to PDB format...", [VIZDOCK_PY3, "convert_sdf_to_pdb.py"])
+
+    # 4) Prepare inputs (MGLTools / Py2)
+    await stage("[4/8] Preparing input files for docking...", [MGLTOOLS_PY, "prepare_inputs.py"])
+
+    # Ensure output dirs exist
+    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
+    VIS_DIR.mkdir(parents=True, exist_ok=True)
+
+    # 5) Docking (Py2)
+    await stage("[5/8] Running docking...", [MGLTOOLS_PY, "docking.py"])
+
+    if not OUTPUT_DIR.exists():
+        log(f"ERROR: Output folder not found: {OUTPUT_DIR}")
+        sys.exit(1)
+
+    # 6) Extract results (Py2) and 7) Visualization (Py3) side by side
+    await asyncio.gather(
+        stage("[6/8] Extracting docking results...", [MGLTOOLS_PY, "extract_results.py"]),
+        stage("[7/8] Running visualization (Py3 env)...",
+              [VIZDOCK_PY3, "visualize.py", "data/ligands", str(OUTPUT_DIR), str(VIS_DIR)]),
+    )
+
 def main():
     os.chdir(here())
 
@@ -142,8 +198,7 @@ def main():
     log(f"Started at {time.strftime('%Y-%m-%d %H:%M:%S')}")
     log("=" * 40)
 
-    # 1) Downloader
-    log("[1/7] Downloading protein and ligand data...")
+    # Resolve the downloader and check both interpreters up front, since stages overlap
     dl = None
     if Path("download_data.py").exists():
         dl = "download_data.py"
@@ -152,51 +207,22 @@ def main():
     else:
         log("ERROR: No downloader found (download_data.py or downlaod_inputs.py).")
         sys.exit(1)
-    run_cmd([sys.executable, dl])
-
-    # 1.5) Convert SDF -> PDB (RDKit, Python 3 env)
-    log("[1.5/7] Converting ligand SDF to PDB format...")
-    run_cmd([VIZDOCK_PY3, "convert_sdf_to_pdb.py"])
-
-    # 2) Prepare inputs (MGLTools / Py2)
-    log("[2/7] Preparing input files for docking...")
     if not Path(MGLTOOLS_PY).exists():
         log(f"ERROR: MGLTools python not found at: {MGLTOOLS_PY}")
         sys.exit(1)
-    run_cmd([MGLTOOLS_PY, "prepare_inputs.py"])
-
-    # Ensure output dirs exist
-    OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
-    VIS_DIR.mkdir(parents=True, exist_ok=True)
-
-    # 3) Docking (Py2)
-    log("[3/7] Running docking...")
-    run_cmd([MGLTOOLS_PY, "docking.py"])
-
-    if not OUTPUT_DIR.exists():
-        log(f"ERROR: Output folder not found: {OUTPUT_DIR}")
-        sys.exit(1)
-
-    # 4) Extract results (Py2)
-    log("[4/7] Extracting docking results...")
-    run_cmd([MGLTOOLS_PY, "extract_results.py"])
-
-    # 5) Ensure Py3 deps
-    log("[5/7] Checking/installing missing Python packages (Py3 env)...")
     if not Path(VIZDOCK_PY3).exists():
         log(f"ERROR: Python 3 (vizdock) not found at: {VIZDOCK_PY3}")
         sys.exit(1)
-    run_cmd([VIZDOCK_PY3, "check_install_packages.py"])
 
-    # 6) Visualization (Py3)
-    log("[6/7] Running visualization (Py3 env)...")
-    run_cmd([VIZDOCK_PY3, "visualize.py", "data/ligands", str(OUTPUT_DIR), str(VIS_DIR)])
+    asyncio.run(run_pipeline(dl))
 
-    log("[7/7] Workflow completed successfully!")
+    log("[8/8] Workflow completed successfully!")
     log(f"Log saved to {LOGFILE}")
 if __name__ == "__main__":
     try:
         main()
+    except StageFailed as e:
+        sys.exit(e.returncode)
     except KeyboardInterrupt:
         log("[ABORTED] KeyboardInterrupt")
         sys.exit(130)
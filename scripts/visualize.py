@@ -3,14 +3,22 @@
 
 """
 Visualize docking results:
- - 2D PNGs from original SDF/MOL2 ligands (RDKit)
+ - 2D SVGs (PNGs with VIZ_RASTER=1) from original SDF/MOL2 ligands (RDKit)
  - 3D PNGs of receptor + docked pose (PyMOL, ray traced, perspective)
  - Flat 2D-style PNGs of receptor + docked pose (PyMOL, no ray, orthoscopic)
 Requirements (same environment): pymol, rdkit (vizdock env)
 """
 
+import io
 import os
 import sys
+import logging
+import queue
+import shutil
+import tempfile
+import itertools
+import threading
+from concurrent.futures import ProcessPoolExecutor
 
 # ==== Enforce the right interpreter (vizdock) ====
 EXPECTED_PY = r"C:\Users\Tayyab\miniconda3\envs\vizdock\python.exe"
@@ -33,7 +41,8 @@ except Exception as e:
 
 try:
     from rdkit import Chem
-    from rdkit.Chem import Draw
+    from rdkit.Chem import rdDepictor
+    from rdkit.Chem.Draw import rdMolDraw2D
 except Exception as e:
     sys.stderr.write("[ERROR] Could not import RDKit. Is RDKit installed in vizdock? %s\n" % e)
     sys.exit(4)
@@ -45,49 +54,143 @@ A = lambda *p: os.path.abspath(os.path.join(SCRIPT_DIR, *p))
 RECEPTOR_PDB_DIR   = A("data", "proteins")                      # preferred (cartoon quality)
 RECEPTOR_PDBQT_DIR = A("results", "docking", "receptors")       # fallback
 
+def _build_receptor_index():
+    """{rec_name: path} from one scan of each receptor dir; a .pdb wins over a .pdbqt."""
+    idx = {}
+    for folder, suffix in ((RECEPTOR_PDB_DIR, ".pdb"), (RECEPTOR_PDBQT_DIR, ".pdbqt")):
+        if not os.path.isdir(folder):
+            continue
+        with os.scandir(folder) as it:
+            for e in it:
+                if e.is_file() and e.name.endswith(suffix):
+                    idx.setdefault(e.name[:-len(suffix)], os.path.join(folder, e.name))
+    return idx
+
+RECEPTOR_INDEX = _build_receptor_index()
+
+# Worker processes for complex rendering (each owns a PyMOL session; cmd is not thread-safe)
+VIZ_JOBS = int(os.environ.get("VIZ_JOBS", "0")) or max(1, (os.cpu_count() or 2) // 2)
+# Ray-tracer threads per worker; 0 = share the cores evenly between workers
+VIZ_RAY_THREADS = int(os.environ.get("VIZ_RAY_THREADS", "0"))
+# VIZ_QUALITY=fast trades shadows, lights and antialiasing in the 3D render for speed (default: high)
+VIZ_FAST = os.environ.get("VIZ_QUALITY", "high").lower() == "fast"
+# 2D ligand depictions are always written as SVG; VIZ_RASTER=1 also writes a 500x500 PNG
+VIZ_RASTER = os.environ.get("VIZ_RASTER", "0") in ("1", "true", "True")
+
+# ---------- Logging ----------
+# Progress goes to stdout like the old print() calls, also when the render functions are
+# imported; main() swaps in the buffered handler below.
+log = logging.getLogger("vizdock")
+log.setLevel(logging.INFO)
+log.propagate = False
+_default_handler = logging.StreamHandler(sys.stdout)
+_default_handler.setFormatter(logging.Formatter("%(message)s"))
+log.addHandler(_default_handler)
+
+class _BufferedStreamHandler(logging.StreamHandler):
+    """StreamHandler without the flush after every record; output leaves in 64 KiB blocks."""
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+def _setup_logging():
+    stream = io.TextIOWrapper(open(sys.stdout.fileno(), "wb", buffering=1 << 16, closefd=False),
+                              encoding="utf-8", write_through=False)
+    handler = _BufferedStreamHandler(stream)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    log.removeHandler(_default_handler)
+    log.addHandler(handler)
+
+def _flush_log():
+    for handler in log.handlers:
+        handler.flush()
+
 # ---------- 2D LIGAND IMAGES ----------
+def _needs_2d_coords(mol):
+    """
+    True unless the molecule already carries a usable 2D depiction: a flat conformer
+    (z == 0) whose atoms are actually spread out in x/y. All-zero coordinate blocks
+    are flat too, but would draw as a single point.
+    """
+    if mol.GetNumConformers() == 0:
+        return True
+    conf = mol.GetConformer()
+    pos = [conf.GetAtomPosition(i) for i in range(mol.GetNumAtoms())]
+    if conf.Is3D() or any(abs(p.z) > 1e-3 for p in pos):
+        return True
+    if len(pos) < 2:
+        return False
+    xs, ys = [p.x for p in pos], [p.y for p in pos]
+    return max(max(xs) - min(xs), max(ys) - min(ys)) < 1e-3
+
+def _depict_2d(mol):
+    """Kekulize and lay out 2D coordinates in place (best effort), skipping work the input makes redundant."""
+    if any(atom.GetIsAromatic() for atom in mol.GetAtoms()):
+        try:
+            Chem.Kekulize(mol, clearAromaticFlags=True)
+        except:
+            pass
+    if _needs_2d_coords(mol):
+        try:
+            rdDepictor.Compute2DCoords(mol)
+        except:
+            pass
+
+def _draw(drawer, mol):
+    drawer.DrawMolecule(mol)
+    drawer.FinishDrawing()
+    return drawer
+
 def generate_2d_images(ligand_folder, out_dir):
     if not os.path.exists(out_dir):
         os.makedirs(out_dir)
 
-    ligs = [f for f in os.listdir(ligand_folder)
-            if f.lower().endswith((".sdf", ".mol2"))]
+    with os.scandir(ligand_folder) as it:
+        ligs = [e.name for e in it
+                if e.is_file() and e.name.lower().endswith((".sdf", ".mol2"))]
     if not ligs:
-        print("No ligand files found in %s" % ligand_folder)
+        log.info("No ligand files found in %s", ligand_folder)
         return
 
+    loaded = []
     for fname in sorted(ligs):
         path = os.path.join(ligand_folder, fname)
         mols = []
 
         if fname.lower().endswith(".sdf"):
-            suppl = Chem.SDMolSupplier(path, removeHs=False, sanitize=True)
-            if suppl:
-                for m in suppl:
-                    if m: mols.append(m)
+            # Only the first molecule is drawn, so stream the file and stop at the first valid record
+            with open(path, "rb") as fh:
+                for m in Chem.ForwardSDMolSupplier(fh, removeHs=False, sanitize=True):
+                    if m:
+                        mols.append(m)
+                        break
         else:  # .mol2
             m = Chem.MolFromMol2File(path, sanitize=True, removeHs=False)
             if m: mols.append(m)
 
         if not mols:
-            print("Failed to read ligand:", fname)
+            log.warning("Failed to read ligand: %s", fname)
             continue
 
         # Save ONE PNG per file (first molecule)
-        mol = mols[0]
-        try:
-            Chem.Kekulize(mol, clearAromaticFlags=True)
-        except:
-            pass
-        try:
-            Chem.rdDepictor.Compute2DCoords(mol)
-        except:
-            pass
-
-        img_path = os.path.join(out_dir, os.path.splitext(fname)[0] + ".png")
-        img = Draw.MolToImage(mol, size=(500, 500))
-        img.save(img_path)
-        print("Saved 2D image:", img_path)
+        loaded.append((fname, mols[0]))
+
+    # Depict everything in one pre-pass, then draw
+    for _, mol in loaded:
+        _depict_2d(mol)
+
+    for fname, mol in loaded:
+        stem = os.path.join(out_dir, os.path.splitext(fname)[0])
+        # A fresh drawer per molecule, since a reused drawer keeps the scale fitted to the first one
+        svg = _draw(rdMolDraw2D.MolDraw2DSVG(500, 500), mol)
+        with open(stem + ".svg", "w") as f:
+            f.write(svg.GetDrawingText())
+        log.info("Saved 2D image: %s", stem + ".svg")
+        if VIZ_RASTER:
+            _draw(rdMolDraw2D.MolDraw2DCairo(500, 500), mol).WriteDrawingText(stem + ".png")
+            log.info("Saved 2D image: %s", stem + ".png")
 
 # ---------- Helpers for receptor ↔ vina_out mapping ----------
 def _find_receptor_for_vina_out(vina_out_path):
@@ -102,63 +205,96 @@ def _find_receptor_for_vina_out(vina_out_path):
         return None, None
     rec_name = parts[0]
 
-    pdb = os.path.join(RECEPTOR_PDB_DIR, rec_name + ".pdb")
-    if os.path.isfile(pdb):
-        return rec_name, pdb
-
-    pdbqt = os.path.join(RECEPTOR_PDBQT_DIR, rec_name + ".pdbqt")
-    if os.path.isfile(pdbqt):
-        return rec_name, pdbqt
-
-    return rec_name, None
+    return rec_name, RECEPTOR_INDEX.get(rec_name)
 
 # ---------- Scene styles ----------
-def _style_flat_2d():
-    """Flat, publication-style look (orthoscopic, no ray/shadows)."""
-    cmd.bg_color("white")
-    cmd.set("orthoscopic", 1)
-    cmd.set("ray_opaque_background", 0)
-    cmd.set("antialias", 2)
-
+# Both styles set the same keys, so switching scenes only has to push the values that differ.
+FLAT_SETTINGS = {  # flat, publication-style look (orthoscopic, no shadows)
+    "orthoscopic": 1,
+    "ray_opaque_background": 0,
+    "antialias": 2,
     # kill 3D lighting/shadows
-    cmd.set("ambient", 1.0)
-    cmd.set("specular", 0.0)
-    cmd.set("shininess", 0)
-    cmd.set("light_count", 1)
-    cmd.set("depth_cue", 0)
-    cmd.set("ray_shadows", 0)
-    cmd.set("ray_trace_fog", 0)
+    "ambient": 1.0,
+    "specular": 0.0,
+    "shininess": 0,
+    "light_count": 1,
+    "depth_cue": 0,
+    "ray_shadows": 0,
+    "ray_trace_fog": 0,
+    "ray_trace_mode": 0,
+    "ray_trace_gain": 0.12,
+}
+RAY_SETTINGS = {  # nicely lit 3D scene (perspective + ray)
+    "orthoscopic": 0,
+    "ray_opaque_background": 0,
+    "antialias": 2,
+    "ambient": 0.15,
+    "specular": 0.6,
+    "shininess": 60,
+    "light_count": 8,
+    "depth_cue": 1,
+    "ray_shadows": 1,
+    "ray_trace_fog": 1,
+    "ray_trace_mode": 0,
+    "ray_trace_gain": 0.12,
+}
+if VIZ_FAST:
+    RAY_SETTINGS.update({
+        "ray_trace_mode": 3,  # quantized colour + outline, far cheaper than full lighting
+        "ray_trace_gain": 0.1,
+        "light_count": 2,
+        "ray_shadows": 0,
+        "antialias": 1,
+    })
+
+_applied_settings = {}  # what this process's PyMOL session currently has
+
+def _apply_settings(settings):
+    """Push only the settings whose value differs from what the session already has."""
+    for key, value in settings.items():
+        if _applied_settings.get(key) != value:
+            cmd.set(key, value)
+            _applied_settings[key] = value
+
+def _style_flat_2d():
+    _apply_settings(FLAT_SETTINGS)
 
 def _style_3d():
-    """Nicely lit 3D scene (perspective + ray)."""
-    cmd.bg_color("white")
-    cmd.set("orthoscopic", 0)  # perspective
-    cmd.set("ray_opaque_background", 0)
-    cmd.set("antialias", 2)
+    _apply_settings(RAY_SETTINGS)
+
+def _read_raw(path):
+    """File contents + PyMOL format name, for loading from memory with cmd.load_raw."""
+    with open(path) as f:
+        return f.read(), os.path.splitext(path)[1][1:].lower()
 
+def _load_receptor(rec_raw):
+    """Load the receptor from _read_raw() data once; representations are set per scene."""
+    cmd.load_raw(rec_raw[0], rec_raw[1], "rec")
     try:
-        cmd.set("ambient", 0.15)
-        cmd.set("specular", 0.6)
-        cmd.set("shininess", 60)
+        cmd.dss("rec")  # assign secondary structure when possible
     except:
         pass
-    cmd.set("light_count", 8)
-    cmd.set("depth_cue", 1)
-    cmd.set("ray_shadows", 1)
-    cmd.set("ray_trace_fog", 1)
-
-def _load_complex(rec_path, vina_out_path, receptor_rep="cartoon", receptor_color="gray80"):
-    """Load receptor (if path given) + docked ligand pose, and style them."""
-    if rec_path:
-        cmd.load(rec_path, "rec")
-        try:
-            cmd.dss("rec")  # assign secondary structure when possible
-        except:
-            pass
-        cmd.hide("everything", "rec")
-        cmd.show(receptor_rep, "rec")
-        cmd.color(receptor_color, "rec")
-    cmd.load(vina_out_path, "lig")
+
+def _build_receptor_surface():
+    """Compute the whole receptor surface once, hidden; poses only toggle which part is shown."""
+    try:
+        cmd.set("surface_quality", 0 if VIZ_FAST else 1)
+        cmd.set("transparency", 0.35, "rec")
+        cmd.show("surface", "rec")
+        cmd.refresh()  # build the surface now rather than at the first ray trace
+        cmd.hide("surface", "rec")
+    except:
+        pass
+
+def _show_receptor(receptor_rep="cartoon", receptor_color="gray80"):
+    cmd.hide("everything", "rec")
+    cmd.show(receptor_rep, "rec")
+    cmd.color(receptor_color, "rec")
+
+def _load_ligand(vina_out_raw):
+    """Replace the docked ligand pose (_read_raw() data), style it and focus the camera on it."""
+    cmd.delete("lig")
+    cmd.load_raw(vina_out_raw[0], vina_out_raw[1], "lig")
     cmd.hide("everything", "lig")
     cmd.show("sticks", "lig")
     cmd.set("stick_radius", 0.18, "lig")
@@ -172,57 +308,207 @@ def _load_complex(rec_path, vina_out_path, receptor_rep="cartoon", receptor_colo
     cmd.clip("slab", 40)
 
 # ---------- Rendering ----------
+def _ray_threads_per_worker(workers):
+    """Threads for PyMOL's ray tracer, keeping threads * workers <= CPU cores."""
+    cap = max(1, (os.cpu_count() or 1) // workers)
+    return min(VIZ_RAY_THREADS, cap) if VIZ_RAY_THREADS > 0 else cap
+
+def _init_pymol(ray_threads=1):
+    """Pool initializer: start each worker from a clean headless PyMOL session with the shared settings."""
+    cmd.reinitialize()
+    _applied_settings.clear()
+    cmd.bg_color("white")
+    cmd.set("max_threads", ray_threads)
+    cmd.set("hash_max", 200)
+    cmd.set("ray_default_renderer", 0)  # PyMOL's built-in ray tracer for every ray=1 render
+
+def _plan_tasks(paths, workers):
+    """
+    Split the sorted vina outputs into render tasks: one per receptor, with a receptor's
+    poses further split into chunks while there are fewer receptors than workers
+    (each chunk loads the receptor itself), so a single-receptor screen still uses every worker.
+    """
+    # paths are sorted, so poses sharing a <REC>__ prefix are adjacent
+    groups = [list(g) for _, g in itertools.groupby(paths, key=lambda p: os.path.basename(p).split("__")[0])]
+    chunks_per_group = max(1, -(-workers // len(groups)))
+    tasks = []
+    for group in groups:
+        size = -(-len(group) // min(chunks_per_group, len(group)))
+        tasks.extend(group[i:i + size] for i in range(0, len(group), size))
+    return tasks
+
+def _prefetch(tasks, jobs):
+    """Reader stage: pull each task's receptor and poses into memory ahead of the renderers."""
+    try:
+        last_rec = (None, None)
+        for group in tasks:
+            rec_name, rec_path = _find_receptor_for_vina_out(group[0])
+            try:
+                if rec_path and rec_path != last_rec[0]:
+                    last_rec = (rec_path, _read_raw(rec_path))  # chunks of one receptor are adjacent
+            except (IOError, OSError) as e:
+                log.warning("[WARN] Could not read receptor %s: %s", rec_path, e)
+                continue
+            rec_raw = last_rec[1] if rec_path else None
+            poses = []
+            for path in group:
+                try:
+                    poses.append((path, _read_raw(path)))
+                except (IOError, OSError) as e:
+                    log.warning("[WARN] Could not read %s: %s", os.path.basename(path), e)
+            if poses:
+                jobs.put((rec_raw, poses))
+    finally:
+        jobs.put(None)
+
+def _move_out(moves, errors):
+    """Per-worker mover: take each PNG off scratch as soon as it is rendered, while the next pose renders."""
+    for path, src, dst in iter(moves.get, None):
+        try:
+            shutil.move(src, dst)
+        except (IOError, OSError) as e:
+            errors.setdefault(path, e)
+
+def _render_pass(poses, outputs, scratch_dir, dest_dir, moves, suffix, width, height, dpi, ray,
+                 pocket_surface=False):
+    """
+    Render each pose into the styled scene at one fixed size. PNGs go to scratch_dir and are
+    queued on moves for dest_dir; the final paths are appended to outputs[path].
+    """
+    cmd.viewport(width, height)  # once per pass, so cmd.png never has to resize the scene
+    for path, lig_raw in poses:
+        if isinstance(outputs[path], Exception):
+            continue  # failed in an earlier pass
+        try:
+            _load_ligand(lig_raw)
+            if pocket_surface:
+                # Optional: translucent surface around ligand neighborhood; only visibility changes per ligand
+                try:
+                    cmd.hide("surface", "rec")
+                    cmd.show("surface", "rec and byres (lig expand 4)")
+                except:
+                    pass
+            name = os.path.splitext(os.path.basename(path))[0] + suffix
+            png = os.path.join(scratch_dir, name)
+            cmd.png(png, width=width, height=height, dpi=dpi, ray=ray)
+            moves.put((path, png, os.path.join(dest_dir, name)))
+            outputs[path].append(os.path.join(dest_dir, name))
+        except Exception as e:
+            outputs[path] = e
+
+def _render_group(job, scratch_dir, out_dir_3d, out_dir_flat):
+    """
+    Render every pose docked against one receptor in a single session, so the receptor
+    is parsed, dss'd and surfaced once: all flat snapshots first, then all ray-traced
+    3D renders. Each PNG is rendered into scratch_dir and moved to its output dir right away.
+    Returns [(path, (flat_png, ray_png) or the exception)].
+    """
+    rec_raw, poses = job
+    cmd.delete("all")  # settings survive, so the styles are not pushed again
+    if rec_raw:
+        _load_receptor(rec_raw)
+        _build_receptor_surface()
+    outputs = dict((path, []) for path, _ in poses)
+    moves, move_errors = queue.Queue(), {}
+    mover = threading.Thread(target=_move_out, args=(moves, move_errors), daemon=True)
+    mover.start()
+    try:
+        # ---------- Flat 2D snapshots ----------
+        _style_flat_2d()
+        if rec_raw:
+            _show_receptor(receptor_rep="lines", receptor_color="gray50")
+            cmd.set("line_width", 2.0, "rec")
+        _render_pass(poses, outputs, scratch_dir, out_dir_flat, moves,
+                     "__flat.png", 1400, 1000, dpi=220, ray=0)  # no ray
+
+        # ---------- Ray-traced 3D renders ----------
+        _style_3d()
+        if rec_raw:
+            _show_receptor(receptor_rep="cartoon", receptor_color="gray80")
+        _render_pass(poses, outputs, scratch_dir, out_dir_3d, moves,
+                     ".png", 1000, 750, dpi=150, ray=1,  # ray on
+                     pocket_surface=bool(rec_raw))
+    finally:
+        moves.put(None)
+        mover.join()
+
+    outputs.update(move_errors)
+    return [(path, out if isinstance(out, Exception) else tuple(out)) for path, out in outputs.items()]
+
+# tmpfs headroom wanted per render worker; only a pose's PNGs or two sit in scratch at once
+_SCRATCH_PER_WORKER = 32 << 20
+
+def _make_scratch_dir(fallback_dir, workers):
+    """
+    Render target on tmpfs when it has room, so PNG writes don't stall on a slow results
+    filesystem; otherwise a scratch dir next to the outputs, where the moves are renames.
+    """
+    shm = "/dev/shm"
+    try:
+        use_shm = shutil.disk_usage(shm).free >= workers * _SCRATCH_PER_WORKER
+    except OSError:
+        use_shm = False
+    return tempfile.mkdtemp(prefix="vizdock_", dir=shm if use_shm else fallback_dir)
+
+def _report(done):
+    """Writer stage: report each task's renders as it finishes, in file order."""
+    for paths, fut in iter(done.get, None):
+        try:
+            results = fut.result()
+        except Exception as e:
+            results = [(path, e) for path in paths]
+        for path, res in results:
+            if isinstance(res, Exception):
+                log.warning("[WARN] Rendering failed for %s: %s", os.path.basename(path), res)
+                continue
+            log.info("  Saved 2D-style complex image: %s", res[0])
+            log.info("  Saved 3D docking image: %s", res[1])
+        _flush_log()  # progress shows up once per task
+
 def visualize_docking(docking_folder, out_dir_3d, out_dir_flat):
     if not os.path.exists(out_dir_3d):
         os.makedirs(out_dir_3d)
     if not os.path.exists(out_dir_flat):
         os.makedirs(out_dir_flat)
 
-    vina_files = [f for f in os.listdir(docking_folder)
-                  if f.lower().endswith("_out.pdbqt") and "__" in f]
+    with os.scandir(docking_folder) as it:
+        vina_files = [e.name for e in it
+                      if e.is_file() and e.name.lower().endswith("_out.pdbqt") and "__" in e.name]
     if not vina_files:
-        print("No vina output files (*__*_out.pdbqt) found in %s" % docking_folder)
+        log.info("No vina output files (*__*_out.pdbqt) found in %s", docking_folder)
         return
 
-    for f in sorted(vina_files):
-        path = os.path.join(docking_folder, f)
-        rec_name, rec_path = _find_receptor_for_vina_out(path)
-        base = os.path.splitext(f)[0]
-
-        # ---------- Flat 2D snapshot ----------
-        cmd.reinitialize()
-        _style_flat_2d()
-        if rec_path:
-            _load_complex(rec_path, path, receptor_rep="lines", receptor_color="gray50")
-            cmd.set("line_width", 2.0, "rec")
-        else:
-            _load_complex(None, path)
-        flat_png = os.path.join(out_dir_flat, base + "__flat.png")
-        cmd.png(flat_png, width=1400, height=1000, dpi=220, ray=0)  # no ray
-        print("  Saved 2D-style complex image:", flat_png)
-
-        # ---------- Ray-traced 3D render ----------
-        cmd.reinitialize()
-        _style_3d()
-        if rec_path:
-            _load_complex(rec_path, path, receptor_rep="cartoon", receptor_color="gray80")
-            # Optional: translucent surface around ligand neighborhood
-            try:
-                cmd.show("surface", "rec and byres (lig expand 4)")
-                cmd.set("surface_quality", 1)
-                cmd.set("transparency", 0.35, "rec")
-            except:
-                pass
-        else:
-            _load_complex(None, path)
-        ray_png = os.path.join(out_dir_3d, base + ".png")
-        cmd.png(ray_png, width=1000, height=750, dpi=150, ray=1)  # ray on
-        print("  Saved 3D docking image:", ray_png)
+    paths = [os.path.join(docking_folder, f) for f in sorted(vina_files)]
+    tasks = _plan_tasks(paths, VIZ_JOBS)
+    workers = min(VIZ_JOBS, len(tasks))
+
+    # reader thread -> render processes -> writer thread, so disk I/O overlaps ray tracing.
+    # At most 2 tasks per worker are held in memory at once.
+    jobs, done = queue.Queue(maxsize=workers), queue.Queue()
+    slots = threading.BoundedSemaphore(2 * workers)
+    scratch = _make_scratch_dir(out_dir_3d, workers)
+    reader = threading.Thread(target=_prefetch, args=(tasks, jobs), daemon=True)
+    writer = threading.Thread(target=_report, args=(done,), daemon=True)
+    reader.start()
+    writer.start()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_pymol,
+                                 initargs=(_ray_threads_per_worker(workers),)) as ex:
+            for job in iter(jobs.get, None):
+                slots.acquire()
+                fut = ex.submit(_render_group, job, scratch, out_dir_3d, out_dir_flat)
+                fut.add_done_callback(lambda _: slots.release())
+                done.put(([path for path, _ in job[1]], fut))
+        done.put(None)
+        writer.join()
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
 
 # ---------- CLI ----------
 def main():
+    _setup_logging()
     if len(sys.argv) < 4:
-        print("Usage: python visualize.py <ligand_folder> <docking_folder> <output_folder>")
+        log.info("Usage: python visualize.py <ligand_folder> <docking_folder> <output_folder>")
         sys.exit(1)
 
     ligand_folder  = sys.argv[1]
@@ -233,13 +519,13 @@ def main():
     out3d       = os.path.join(output_folder, "3D")
     out2d_cpx   = os.path.join(output_folder, "2D_complex")
 
-    print("Generating 2D ligand images...")
+    log.info("Generating 2D ligand images...")
     generate_2d_images(ligand_folder, out2d)
 
-    print("Generating complex images (flat 2D + ray-traced 3D)...")
+    log.info("Generating complex images (flat 2D + ray-traced 3D)...")
     visualize_docking(docking_folder, out3d, out2d_cpx)
 
-    print("Visualization complete.")
+    log.info("Visualization complete.")
 
 if __name__ == "__main__":
     main()
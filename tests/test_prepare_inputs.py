@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Alt-loc receptor preparation under the thread pool (MGLTools calls are faked)."""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+from multiprocessing.pool import ThreadPool
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+import prepare_inputs
+
+
+def _fake_run_mgl(script_name, args, cwd=None):
+    opts = dict(zip(args[::2], args[1::2]))
+    src = open(opts["-r"]).read()
+    time.sleep(0.05)  # keep both receptors in flight at once
+    if script_name == "prepare_pdb_split_alt_confs.py":
+        for conf in ("A", "B"):
+            with open(opts["-o"] + "_%s.pdb" % conf, "w") as f:
+                f.write("%s conf %s\n" % (src.strip(), conf))
+    elif script_name == "prepare_receptor4.py":
+        with open(opts["-o"], "w") as f:
+            f.write(src)
+
+
+class AltlocReceptorTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.saved = dict((k, getattr(prepare_inputs, k)) for k in
+                          ("INPUT_PROTEIN_DIR", "OUTPUT_RECEPTOR_DIR", "ALTLOC_SPLIT_DIR", "_run_mgl"))
+        prepare_inputs.INPUT_PROTEIN_DIR = os.path.join(self.tmp, "proteins")
+        prepare_inputs.OUTPUT_RECEPTOR_DIR = os.path.join(self.tmp, "receptors")
+        prepare_inputs.ALTLOC_SPLIT_DIR = os.path.join(self.tmp, "altloc")
+        prepare_inputs._run_mgl = _fake_run_mgl
+        for d in ("proteins", "receptors", "altloc"):
+            os.makedirs(os.path.join(self.tmp, d))
+        for stem in ("1AAA", "2BBB"):
+            with open(os.path.join(self.tmp, "proteins", stem + ".pdb"), "w") as f:
+                f.write(stem + "\n")
+
+    def tearDown(self):
+        for k, v in self.saved.items():
+            setattr(prepare_inputs, k, v)
+        shutil.rmtree(self.tmp)
+
+    def _prepare_all(self):
+        pool = ThreadPool(2)
+        try:
+            return pool.map(prepare_inputs.prepare_receptor, prepare_inputs._receptor_paths())
+        finally:
+            pool.close()
+            pool.join()
+
+    def test_concurrent_altloc_receptors(self):
+        for _ in range(2):  # the re-run must not pick up split outputs as receptors
+            prepare_inputs.FORCE_REBUILD = True
+            try:
+                self.assertEqual(self._prepare_all(), [True, True])
+            finally:
+                prepare_inputs.FORCE_REBUILD = False
+
+        self.assertEqual(sorted(os.listdir(os.path.join(self.tmp, "proteins"))), ["1AAA.pdb", "2BBB.pdb"])
+        outputs = sorted(f for f in os.listdir(os.path.join(self.tmp, "receptors")) if f.endswith(".pdbqt"))
+        self.assertEqual(outputs, ["1AAA.pdbqt", "2BBB.pdbqt"])
+        for stem in ("1AAA", "2BBB"):
+            with open(os.path.join(self.tmp, "receptors", stem + ".pdbqt")) as f:
+                self.assertEqual(f.read(), "%s conf A\n" % stem)
+
+    def test_stale_split_files_are_not_receptors(self):
+        open(os.path.join(self.tmp, "proteins", "1AAA_split.pdb_A.pdb"), "w").close()
+        names = [os.path.basename(p) for p in prepare_inputs._receptor_paths()]
+        self.assertEqual(names, ["1AAA.pdb", "2BBB.pdb"])
+
+
+if __name__ == "__main__":
+    unittest.main()